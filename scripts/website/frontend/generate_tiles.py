@@ -11,146 +11,657 @@ Example:
 """
 
 import argparse
+import io
 import json
-import math
+import logging
 import os
+import queue
+import shutil
+import sqlite3
+import subprocess
 import sys
+import tempfile
+import threading
+import warnings
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 try:
+    import numpy as np
     from PIL import Image
 except ImportError:
-    print("Error: Pillow is required. Install with: pip install Pillow")
+    print("Error: Pillow and NumPy are required. Install with: pip install Pillow numpy")
     sys.exit(1)
 
+try:
+    import liburing
+except ImportError:
+    liburing = None  # io_uring is Linux-only; fall back to blocking writes
+
+try:
+    import torch
+    import torch.nn.functional as F
+except ImportError:
+    torch = None  # GPU downsampling (--gpu) is optional
+
+try:
+    import pyvips
+except (ImportError, OSError):
+    pyvips = None  # Fall back to the Pillow pipeline
+
+logger = logging.getLogger(__name__)
+
 
 def calculate_padded_size(width: int, height: int, tile_size: int = 256) -> int:
     """Calculate the padded size (power of 2 * tile_size) that fits the image."""
-    max_dim = max(width, height)
-    # Find the smallest power of 2 such that (2^n * tile_size) >= max_dim
-    n = 0
-    while (2 ** n) * tile_size < max_dim:
-        n += 1
-    return (2 ** n) * tile_size
+    # Smallest power of 2 that is >= the number of tiles covering max_dim
+    tiles = (max(width, height) + tile_size - 1) // tile_size
+    return tile_size * (1 << (tiles - 1).bit_length())
 
 
 def calculate_max_zoom(padded_size: int, tile_size: int = 256) -> int:
     """Calculate the maximum zoom level."""
-    return int(math.log2(padded_size / tile_size))
+    return (padded_size // tile_size).bit_length() - 1
 
 
-def create_padded_image(img: Image.Image, padded_size: int) -> Image.Image:
-    """Create a new image with transparent padding."""
-    # Create new RGBA image with transparent background
-    padded = Image.new('RGBA', (padded_size, padded_size), (0, 0, 0, 0))
-    # Paste original image at top-left
-    padded.paste(img, (0, 0))
+def create_padded_array(img: Image.Image, padded_size: int) -> np.ndarray:
+    """Create the RGBA pixel array of the image with transparent padding."""
+    arr = np.asarray(img)
+    if img.size == (padded_size, padded_size):
+        # Already a power-of-2 square, nothing to pad
+        return arr
+    
+    # np.zeros maps pre-zeroed pages, so only the original pixels are copied
+    padded = np.zeros((padded_size, padded_size, 4), dtype=np.uint8)
+    # Copy original image at top-left
+    padded[:img.height, :img.width] = arr
     return padded
 
 
-def generate_tiles(
+def create_tile_directories(output_path: Path, max_zoom: int) -> None:
+    """Create every zoom/x tile directory of the pyramid up front."""
+    for zoom in range(max_zoom + 1):
+        zoom_dir = f"{output_path}/{zoom}"
+        dirs = [zoom_dir] + [f"{zoom_dir}/{x}" for x in range(2 ** zoom)]
+        for path in dirs:
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                pass
+
+
+def count_content_tiles(original_size: int, num_tiles: int, padded_size: int) -> int:
+    """Return how many tiles along one axis overlap the original image; the rest are padding."""
+    return -(-original_size * num_tiles // padded_size)
+
+
+class GpuPyramid:
+    """
+    Downsample pyramid levels on a CUDA device with PyTorch.
+    
+    The padded array is uploaded once in bands and its alpha premultiplied on
+    the device, as Pillow does when resizing RGBA images. Each level is a 2x2 average of the one
+    above it and stays on the device; only the finished level is copied back
+    for tiling.
+    """
+    
+    # Rows pooled per step, bounds the float working set on the device
+    BAND_ROWS = 2048
+    
+    def __init__(self, arr: np.ndarray, device: str = 'cuda'):
+        self.level = torch.empty(arr.shape, dtype=torch.uint8, device=device)
+        with warnings.catch_warnings():
+            # The array may be read-only; it is only read to upload it
+            warnings.simplefilter('ignore', UserWarning)
+            source = torch.from_numpy(arr)
+        for start in range(0, arr.shape[0], self.BAND_ROWS):
+            band = source[start:start + self.BAND_ROWS].to(device).int()
+            # Round like Pillow's RGBA -> RGBa conversion (MULDIV255)
+            product = band[..., :3] * band[..., 3:] + 128
+            band[..., :3] = (product + (product >> 8)) >> 8
+            self.level[start:start + self.BAND_ROWS] = band.to(torch.uint8)
+    
+    def next_level(self) -> np.ndarray:
+        """Halve the current level and return it as an RGBA array."""
+        height, width, bands = self.level.shape
+        halved = torch.empty(
+            (height // 2, width // 2, bands), dtype=torch.uint8, device=self.level.device
+        )
+        for start in range(0, height, self.BAND_ROWS):
+            band = self.level[start:start + self.BAND_ROWS].permute(2, 0, 1).float()
+            pooled = (F.avg_pool2d(band, 2) + 0.5).floor().to(torch.uint8)
+            halved[start // 2:(start + self.BAND_ROWS) // 2] = pooled.permute(1, 2, 0)
+        self.level = halved
+        
+        level_img = Image.frombuffer(
+            'RGBa', (width // 2, height // 2), halved.cpu().numpy(), 'raw', 'RGBa', 0, 1
+        )
+        return np.asarray(level_img.convert('RGBA'))
+
+
+def create_gpu_pyramid(arr: np.ndarray) -> GpuPyramid | None:
+    """Upload the padded array to the GPU, or return None if CUDA is unavailable."""
+    if torch is None:
+        logger.warning("PyTorch is not installed, downsampling on the CPU")
+        return None
+    if not torch.cuda.is_available():
+        logger.warning("No CUDA device available, downsampling on the CPU")
+        return None
+    return GpuPyramid(arr)
+
+
+def encode_png(tile: np.ndarray, optimize: bool = False) -> bytes:
+    """
+    Encode an RGBA tile array as PNG bytes.
+    
+    Uses the fastest zlib level, since optimize_pngs recompresses the finished
+    tiles; with `optimize` (for tiles that never reach oxipng) the smallest.
+    """
+    # pyspng (libspng) has no encoder as of 0.1.4, only pyspng.load, so
+    # tiles are encoded with Pillow
+    buffer = io.BytesIO()
+    if optimize:
+        Image.fromarray(tile).save(buffer, 'PNG', optimize=True)
+    else:
+        Image.fromarray(tile).save(buffer, 'PNG', compress_level=1)
+    return buffer.getvalue()
+
+
+def optimize_pngs(output_path: Path, workers: int | None = None) -> None:
+    """Recompress every tile under output_path with oxipng, if it is installed."""
+    oxipng = shutil.which('oxipng')
+    if oxipng is None:
+        logger.info("oxipng not found, tiles are left at zlib level 1")
+        return
+    
+    logger.info("Optimizing tiles with oxipng...")
+    subprocess.run(
+        [oxipng, '-o', '4', '--threads', str(workers or os.cpu_count()), '--quiet', '-r', str(output_path)],
+        check=True
+    )
+
+
+class TileWriter:
+    """Write encoded tiles to output_path/z/x/y.png with one blocking write per tile."""
+    
+    def __init__(self, output_path: Path):
+        self.root = str(output_path)
+    
+    def tile_path(self, zoom: int, x: int, y: int) -> str:
+        return f"{self.root}/{zoom}/{x}/{y}.png"
+    
+    def write(self, zoom: int, x: int, y: int, data: bytes) -> None:
+        with open(self.tile_path(zoom, x, y), 'wb', buffering=0) as f:
+            f.write(data)
+    
+    def flush(self) -> None:
+        pass
+    
+    def close(self) -> None:
+        pass
+
+
+class UringTileWriter(TileWriter):
+    """
+    Batch tile writes through io_uring.
+    
+    Writes are queued and submitted to the kernel `batch_size` at a time with
+    a single io_uring_enter(), then their completions are drained.
+    """
+    
+    def __init__(self, output_path: Path, batch_size: int = 128, queue_depth: int = 1024):
+        super().__init__(output_path)
+        self.batch_size = batch_size
+        self.ring = liburing.Ring()
+        self.cqe = liburing.Cqe()
+        liburing.io_uring_queue_init(queue_depth, self.ring)
+        # (fd, data) per queued write; buffers must outlive their completion
+        self.pending: list[tuple[int, bytes]] = []
+    
+    def write(self, zoom: int, x: int, y: int, data: bytes) -> None:
+        fd = os.open(self.tile_path(zoom, x, y), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            sqe = liburing.io_uring_get_sqe(self.ring)
+            liburing.io_uring_prep_write(sqe, fd, data, 0)
+        except BaseException:
+            # Not queued yet, so flush won't close it
+            os.close(fd)
+            raise
+        liburing.io_uring_sqe_set_data64(sqe, len(self.pending))
+        self.pending.append((fd, data))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+    
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        
+        liburing.io_uring_submit(self.ring)
+        error = None
+        try:
+            # Reap every completion even after a failed write, so none is
+            # left behind to be matched against a later batch
+            for _ in range(len(self.pending)):
+                liburing.io_uring_wait_cqe(self.ring, self.cqe)
+                entry = self.cqe[0]
+                fd, data = self.pending[entry.user_data]
+                result = entry.res
+                liburing.io_uring_cqe_seen(self.ring, entry)
+                if error is not None:
+                    continue
+                try:
+                    written = liburing.trap_error(result)
+                    if written < len(data):
+                        # Finish a short write synchronously
+                        os.pwrite(fd, data[written:], written)
+                except OSError as e:
+                    error = e
+        finally:
+            for fd, _ in self.pending:
+                os.close(fd)
+            self.pending.clear()
+        if error is not None:
+            raise error
+    
+    def close(self) -> None:
+        self.flush()
+        liburing.io_uring_queue_exit(self.ring)
+
+
+class ZipTileWriter(TileWriter):
+    """
+    Store tiles in a single output_path/tiles.zip archive.
+    
+    PNG data is already deflated, so entries are stored uncompressed.
+    """
+    
+    def __init__(self, output_path: Path):
+        self.archive = zipfile.ZipFile(
+            output_path / 'tiles.zip', 'w', zipfile.ZIP_STORED, allowZip64=True
+        )
+    
+    def write(self, zoom: int, x: int, y: int, data: bytes) -> None:
+        self.archive.writestr(f"{zoom}/{x}/{y}.png", data)
+    
+    def close(self) -> None:
+        self.archive.close()
+
+
+class MBTilesTileWriter(TileWriter):
+    """
+    Store tiles in a single output_path/tiles.mbtiles SQLite database.
+    
+    All tiles are inserted in one transaction, committed on close.
+    """
+    
+    def __init__(self, output_path: Path, max_zoom: int):
+        path = output_path / 'tiles.mbtiles'
+        path.unlink(missing_ok=True)
+        # Created here but written from the writer thread
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.executescript("""
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+            CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+        """)
+        self.db.executemany("INSERT INTO metadata VALUES (?, ?)", [
+            ('name', output_path.name),
+            ('format', 'png'),
+            ('minzoom', '0'),
+            ('maxzoom', str(max_zoom)),
+        ])
+    
+    def write(self, zoom: int, x: int, y: int, data: bytes) -> None:
+        # MBTiles numbers rows from the bottom (TMS), Leaflet from the top
+        self.db.execute(
+            "INSERT INTO tiles VALUES (?, ?, ?, ?)", (zoom, x, (1 << zoom) - 1 - y, data)
+        )
+    
+    def close(self) -> None:
+        self.db.commit()
+        self.db.close()
+
+
+def create_tile_writer(output_path: Path, max_zoom: int, archive: str | None = None) -> TileWriter:
+    """
+    Return a writer for the requested archive format, or for z/x/y files:
+    through io_uring when available, else blocking.
+    """
+    if archive == 'zip':
+        return ZipTileWriter(output_path)
+    if archive == 'mbtiles':
+        return MBTilesTileWriter(output_path, max_zoom)
+    if liburing is not None:
+        try:
+            return UringTileWriter(output_path)
+        except OSError:
+            # io_uring may be disabled by the kernel or a seccomp policy
+            pass
+    return TileWriter(output_path)
+
+
+class TileWriterThread(threading.Thread):
+    """
+    Write encoded tiles from a bounded queue on a dedicated thread.
+    
+    Encoder threads put (zoom, x, y, data) tuples on `queue` and keep encoding while
+    earlier tiles are written; the bound applies backpressure so encoded tiles
+    cannot pile up in memory. A None sentinel stops the thread.
+    """
+    
+    def __init__(self, writer: TileWriter, maxsize: int = 256):
+        super().__init__(daemon=True)
+        self.writer = writer
+        self.queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.error: BaseException | None = None
+    
+    def run(self) -> None:
+        while (item := self.queue.get()) is not None:
+            # After a failure keep draining so encoders never block on a full queue
+            if self.error is None:
+                try:
+                    self.writer.write(*item)
+                except BaseException as e:
+                    self.error = e
+        try:
+            self.writer.close()
+        except BaseException as e:
+            self.error = self.error or e
+    
+    def finish(self) -> None:
+        """Wait for all queued tiles to be written, re-raising any write error."""
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+
+
+def encode_tile_row(
+    zoom_arr: np.ndarray,
+    y: int,
+    num_cols: int,
+    tile_size: int,
+    zoom: int,
+    tile_queue: queue.Queue,
+    opaque_cols: int = 0,
+    optimize: bool = False
+) -> int:
+    """
+    Slice and encode the first num_cols tiles in row y of a zoom level,
+    queueing them for writing. Returns the number of tiles queued.
+    
+    The row is a contiguous strip of the level, so it stays in cache while
+    all of its tiles are cut out. Fully transparent tiles are skipped, and
+    the first opaque_cols tiles are known to be opaque and saved as RGB.
+    `optimize` is passed on to encode_png.
+    """
+    # Every tile is copied into one of these before encoding, so the encoder
+    # always reads the same contiguous memory instead of a fresh allocation
+    rgb_buffer = np.empty((tile_size, tile_size, 3), dtype=np.uint8)
+    rgba_buffer = np.empty((tile_size, tile_size, 4), dtype=np.uint8)
+    
+    count = 0
+    upper = y * tile_size
+    strip = zoom_arr[upper:upper + tile_size]
+    for x in range(num_cols):
+        # Extract tile region (a view, no copy)
+        left = x * tile_size
+        tile = strip[:, left:left + tile_size]
+        if x < opaque_cols:
+            tile, buffer = tile[..., :3], rgb_buffer
+        elif tile[..., 3].any():
+            buffer = rgba_buffer
+        else:
+            continue
+        np.copyto(buffer, tile)
+        
+        # Encode tile as PNG with transparency
+        tile_queue.put((zoom, x, y, encode_png(buffer, optimize)))
+        count += 1
+    
+    return count
+
+
+def save_metadata(
+    output_path: Path,
+    original_width: int,
+    original_height: int,
+    padded_size: int,
+    max_zoom: int,
+    tile_size: int,
+    total_tiles: int
+) -> dict:
+    """Write metadata.json and log the calibration.ts configuration."""
+    # Create metadata
+    metadata = {
+        "original_width": original_width,
+        "original_height": original_height,
+        "padded_size": padded_size,
+        "max_zoom": max_zoom,
+        "tile_size": tile_size,
+        # Tiles actually written: padding-only and fully transparent tiles are skipped
+        "total_tiles": total_tiles
+    }
+    
+    # Save metadata
+    metadata_path = output_path / "metadata.json"
+    with open(metadata_path, 'w') as f:
+        json.dump(metadata, f)
+    
+    logger.info(
+        f"Generated {total_tiles} tiles\n"
+        f"Metadata saved to: {metadata_path}\n"
+        "\n=== Configuration for calibration.ts ===\n"
+        f"width: {original_width},\n"
+        f"height: {original_height},\n"
+        f"paddedSize: {padded_size}, // 2^{max_zoom} * {tile_size}\n"
+        f"maxZoom: {max_zoom},\n"
+        f"tileSize: {tile_size},"
+    )
+    
+    return metadata
+
+
+def generate_tiles_vips(
     input_path: str,
     output_dir: str,
     tile_size: int = 256
+) -> dict:
+    """
+    Generate Leaflet tiles from source image with libvips.
+    
+    The source is streamed and the pyramid is built tile by tile, so neither
+    the full image nor its padded copy is ever held in memory. dzsave's google
+    layout pads the image at the top-left like create_padded_array and skips
+    blank tiles, but names tiles z/y/x; they are moved to Leaflet's z/x/y.
+    
+    Returns metadata dict with image dimensions and tile info.
+    """
+    logger.info(f"Loading image: {input_path}")
+    
+    # Stream the image as 8-bit sRGB like Image.convert('RGBA'), adding an
+    # alpha channel so padding is transparent
+    img = pyvips.Image.new_from_file(input_path, access='sequential').colourspace('srgb')
+    if img.format != 'uchar':
+        img = img.cast('uchar')
+    if not img.hasalpha():
+        img = img.bandjoin(255)
+    original_width, original_height = img.width, img.height
+    
+    # Calculate padding and zoom
+    padded_size = calculate_padded_size(original_width, original_height, tile_size)
+    max_zoom = calculate_max_zoom(padded_size, tile_size)
+    
+    logger.info(
+        f"Original size: {original_width} x {original_height}\n"
+        f"Padded size: {padded_size} x {padded_size}\n"
+        f"Max zoom: {max_zoom}"
+    )
+    
+    # Create output directory
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    create_tile_directories(output_path, max_zoom)
+    
+    logger.info("Generating tiles with libvips...")
+    total_tiles = 0
+    with tempfile.TemporaryDirectory(dir=output_path) as staging_dir:
+        # dzsave doesn't create the directory itself if every tile is blank
+        pyramid_dir = f"{staging_dir}/pyramid"
+        os.mkdir(pyramid_dir)
+        img.dzsave(
+            pyramid_dir,
+            layout='google',
+            tile_size=tile_size,
+            overlap=0,
+            depth='onetile',
+            suffix='.png[compression=1,filter=all]',
+            background=[0, 0, 0, 0],
+            skip_blanks=0
+        )
+        
+        # Move z/y/x.png tiles to z/x/y.png (renames within one filesystem)
+        for zoom in range(max_zoom + 1):
+            zoom_dir = f"{pyramid_dir}/{zoom}"
+            if not os.path.isdir(zoom_dir):
+                continue  # Every tile at this level was blank
+            for y in os.listdir(zoom_dir):
+                for name in os.listdir(f"{zoom_dir}/{y}"):
+                    x = name.removesuffix('.png')
+                    os.replace(f"{zoom_dir}/{y}/{name}", f"{output_path}/{zoom}/{x}/{y}.png")
+                    total_tiles += 1
+    
+    optimize_pngs(output_path)
+    
+    return save_metadata(
+        output_path, original_width, original_height, padded_size, max_zoom, tile_size, total_tiles
+    )
+
+
+def generate_tiles(
+    input_path: str,
+    output_dir: str,
+    tile_size: int = 256,
+    workers: int | None = None,
+    gpu: bool = False,
+    use_vips: bool = True,
+    archive: str | None = None
 ) -> dict:
     """
     Generate Leaflet tiles from source image.
     
+    Uses libvips when pyvips is installed (unless `use_vips` is False or `gpu`
+    is requested). Otherwise tiles are encoded on a pool of `workers` threads
+    (defaults to the CPU count); Pillow releases the GIL while encoding.
+    Encoded tiles are written by a separate writer thread, in batches through
+    io_uring when liburing is installed. With `gpu`, the pyramid levels are
+    downsampled on a CUDA device. With `archive` ('zip' or 'mbtiles'), tiles
+    are stored in a single archive file instead of a z/x/y directory tree.
+    
     Returns metadata dict with image dimensions and tile info.
     """
-    print(f"Loading image: {input_path}")
+    if use_vips and not gpu and archive is None and pyvips is not None:
+        return generate_tiles_vips(input_path, output_dir, tile_size)
+    
+    logger.info(f"Loading image: {input_path}")
     
     # Load image in RGBA mode to preserve/add transparency
-    img = Image.open(input_path).convert('RGBA')
+    source = Image.open(input_path)
+    opaque = 'A' not in source.getbands() and 'transparency' not in source.info
+    img = source.convert('RGBA')
+    del source
     original_width, original_height = img.size
-    print(f"Original size: {original_width} x {original_height}")
     
     # Calculate padding and zoom
     padded_size = calculate_padded_size(original_width, original_height, tile_size)
     max_zoom = calculate_max_zoom(padded_size, tile_size)
     
-    print(f"Padded size: {padded_size} x {padded_size}")
-    print(f"Max zoom: {max_zoom}")
+    logger.info(
+        f"Original size: {original_width} x {original_height}\n"
+        f"Padded size: {padded_size} x {padded_size}\n"
+        f"Max zoom: {max_zoom}"
+    )
     
     # Create padded image with transparent background
-    print("Creating padded image with transparent background...")
-    padded_img = create_padded_image(img, padded_size)
+    logger.info("Creating padded image with transparent background...")
+    zoom_arr = create_padded_array(img, padded_size)
+    del img
     
     # Create output directory
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
+    if archive is None:
+        create_tile_directories(output_path, max_zoom)
     
-    # Generate tiles for each zoom level
+    # Generate tiles for each zoom level, building the pyramid bottom-up so
+    # only the current and previous levels are ever held in memory
     total_tiles = 0
-    for zoom in range(max_zoom + 1):
-        zoom_dir = output_path / str(zoom)
-        zoom_dir.mkdir(exist_ok=True)
+    level_summaries = []
+    gpu_pyramid = create_gpu_pyramid(zoom_arr) if gpu else None
+    # The CPU pyramid halves a Pillow image sharing zoom_arr's memory; the GPU
+    # one needs nothing on the host once the max zoom level has been tiled
+    zoom_img = Image.fromarray(zoom_arr) if gpu_pyramid is None else None
+    executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+    writer_thread = TileWriterThread(create_tile_writer(output_path, max_zoom, archive))
+    writer_thread.start()
+    try:
+        for zoom in range(max_zoom, -1, -1):
+            # Calculate size at this zoom level
+            zoom_size = tile_size * (2 ** zoom)
         
-        # Calculate size at this zoom level
-        zoom_size = tile_size * (2 ** zoom)
+            # At max zoom, use the padded array directly; every lower level
+            # averages 2x2 pixel blocks of the level above it
+            if zoom == max_zoom:
+                pass
+            elif gpu_pyramid is not None:
+                zoom_arr = gpu_pyramid.next_level()
+            else:
+                zoom_img = zoom_img.reduce(2)
+                zoom_arr = np.asarray(zoom_img)
         
-        # Resize image for this zoom level
-        if zoom == max_zoom:
-            # At max zoom, use the padded image directly
-            zoom_img = padded_img
-        else:
-            # Resize to smaller size for lower zoom levels
-            zoom_img = padded_img.resize((zoom_size, zoom_size), Image.Resampling.LANCZOS)
+            # Calculate number of tiles
+            num_tiles = 2 ** zoom
         
-        # Calculate number of tiles
-        num_tiles = 2 ** zoom
+            # Tiles past the original image are pure padding: skip them, Leaflet
+            # leaves missing tiles blank
+            num_cols = count_content_tiles(original_width, num_tiles, padded_size)
+            num_rows = count_content_tiles(original_height, num_tiles, padded_size)
         
-        print(f"Zoom {zoom}: {num_tiles}x{num_tiles} tiles ({zoom_size}x{zoom_size} px)")
+            # Tiles lying entirely inside an opaque source need no alpha channel
+            opaque_cols = original_width * num_tiles // padded_size if opaque else 0
+            opaque_rows = original_height * num_tiles // padded_size if opaque else 0
         
-        # Generate tiles
-        for x in range(num_tiles):
-            x_dir = zoom_dir / str(x)
-            x_dir.mkdir(exist_ok=True)
-            
-            for y in range(num_tiles):
-                # Extract tile region
-                left = x * tile_size
-                upper = y * tile_size
-                right = left + tile_size
-                lower = upper + tile_size
-                
-                tile = zoom_img.crop((left, upper, right, lower))
-                
-                # Save tile as PNG with transparency
-                tile_path = x_dir / f"{y}.png"
-                tile.save(tile_path, 'PNG', optimize=True)
-                total_tiles += 1
+            level_summaries.append(
+                f"Zoom {zoom}: {num_tiles}x{num_tiles} tiles ({zoom_size}x{zoom_size} px)"
+            )
         
-        # Clean up zoom image if not max zoom
-        if zoom != max_zoom:
-            del zoom_img
-    
-    print(f"Generated {total_tiles} tiles")
-    
-    # Create metadata
-    metadata = {
-        "original_width": original_width,
-        "original_height": original_height,
-        "padded_size": padded_size,
-        "max_zoom": max_zoom,
-        "tile_size": tile_size,
-        "total_tiles": total_tiles
-    }
+            # Generate tiles, one row strip of tiles per task
+            futures = [
+                executor.submit(
+                    encode_tile_row, zoom_arr, y, num_cols, tile_size, zoom,
+                    writer_thread.queue, opaque_cols if y < opaque_rows else 0,
+                    archive is not None  # Archived tiles skip the oxipng pass
+                )
+                for y in range(num_rows)
+            ]
+            for future in futures:
+                total_tiles += future.result()
+    finally:
+        # Always stop the pool and close the writer, so an encoder error
+        # cannot leave the writer thread blocked or an archive unfinished
+        executor.shutdown(cancel_futures=True)
+        writer_thread.finish()
     
-    # Save metadata
-    metadata_path = output_path / "metadata.json"
-    with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
+    if archive is None:
+        optimize_pngs(output_path, workers)
     
-    print(f"Metadata saved to: {metadata_path}")
-    print("\n=== Configuration for calibration.ts ===")
-    print(f"width: {original_width},")
-    print(f"height: {original_height},")
-    print(f"paddedSize: {padded_size}, // 2^{max_zoom} * {tile_size}")
-    print(f"maxZoom: {max_zoom},")
-    print(f"tileSize: {tile_size},")
+    # Logged once the pyramid is done rather than from inside the tile loop
+    logger.info("\n".join(reversed(level_summaries)))
     
-    return metadata
+    return save_metadata(
+        output_path, original_width, original_height, padded_size, max_zoom, tile_size, total_tiles
+    )
 
 
 def main():
@@ -171,16 +682,43 @@ def main():
         default=256,
         help='Tile size in pixels (default: 256)'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=None,
+        help='Number of tile encoding threads (default: CPU count)'
+    )
+    parser.add_argument(
+        '--gpu',
+        action='store_true',
+        help='Downsample zoom levels on a CUDA GPU (requires PyTorch)'
+    )
+    parser.add_argument(
+        '--no-vips',
+        action='store_true',
+        help='Use the Pillow pipeline even if pyvips is installed'
+    )
+    parser.add_argument(
+        '--archive',
+        choices=['zip', 'mbtiles'],
+        default=None,
+        help='Write tiles to a single tiles.zip or tiles.mbtiles file in the output directory'
+    )
     
     args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logging.getLogger('pyvips').setLevel(logging.WARNING)  # Silence libvips progress chatter
     
     if not os.path.exists(args.input):
-        print(f"Error: Input file not found: {args.input}")
+        logger.error(f"Input file not found: {args.input}")
         sys.exit(1)
     
-    metadata = generate_tiles(args.input, args.output, args.tile_size)
+    metadata = generate_tiles(
+        args.input, args.output, args.tile_size, args.workers, args.gpu, not args.no_vips,
+        args.archive
+    )
     
-    print("\nDone!")
+    logger.info("\nDone!")
     return metadata
 
 
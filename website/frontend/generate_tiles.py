@@ -12,89 +12,233 @@ Example:
 
 import os
 import sys
+import io
 import json
-import math
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 try:
+    import numpy as np
     from PIL import Image
 except ImportError:
-    print("Error: Pillow is required. Install with: pip install Pillow")
+    print("Error: Pillow and NumPy are required. Install with: pip install Pillow numpy")
     sys.exit(1)
 
+try:
+    import simplejpeg
+except ImportError:
+    simplejpeg = None  # Fall back to Pillow's JPEG encoder
+
+try:
+    import pyvips
+except (ImportError, OSError):
+    pyvips = None  # Fall back to the Pillow pipeline
+
+logger = logging.getLogger(__name__)
+
 
 def next_power_of_2(n: int) -> int:
     """Return the smallest power of 2 >= n."""
     return 1 << (n - 1).bit_length()
 
 
-def generate_tiles(source_path: str, output_dir: str, tile_size: int = 256):
-    """Generate map tiles from source image."""
+def create_tile_directories(output_path: Path, max_zoom: int) -> None:
+    """Create every zoom/x tile directory of the pyramid up front."""
+    for zoom in range(max_zoom + 1):
+        zoom_dir = f"{output_path}/{zoom}"
+        dirs = [zoom_dir] + [f"{zoom_dir}/{x}" for x in range(2 ** zoom)]
+        for path in dirs:
+            try:
+                os.mkdir(path)
+            except FileExistsError:
+                pass
+
+
+def count_content_tiles(original_size: int, num_tiles: int, padded_size: int) -> int:
+    """Return how many tiles along one axis overlap the original image; the rest are padding."""
+    return -(-original_size * num_tiles // padded_size)
+
+
+def encode_jpeg(tile: np.ndarray) -> bytes:
+    """Encode an RGB tile array as JPEG, using libjpeg-turbo via simplejpeg when available."""
+    if simplejpeg is not None:
+        return simplejpeg.encode_jpeg(np.ascontiguousarray(tile), quality=85, colorspace='RGB', fastdct=True)
+    buffer = io.BytesIO()
+    Image.fromarray(tile).save(buffer, "JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def save_tile_row(resized: np.ndarray, y: int, num_cols: int, tile_size: int, zoom_dir: str) -> int:
+    """Slice and save the first num_cols tiles in row y of a zoom level, one cache-friendly strip at a time."""
+    # Reused for every tile in the row so the encoder reads contiguous memory
+    buffer = np.empty((tile_size, tile_size, 3), dtype=np.uint8)
     
-    print(f"Loading source image: {source_path}")
+    upper = y * tile_size
+    strip = resized[upper:upper + tile_size]
+    for x in range(num_cols):
+        # Extract tile (a view, no copy) into the reused buffer
+        left = x * tile_size
+        np.copyto(buffer, strip[:, left:left + tile_size])
+        
+        # Save tile
+        with open(f"{zoom_dir}/{x}/{y}.jpg", 'wb', buffering=0) as f:
+            f.write(encode_jpeg(buffer))
+    
+    return num_cols
+
+
+BACKGROUND_COLOR = (26, 26, 46)  # Match site background #1a1a2e
+
+
+def save_tiles_pillow(
+    source: Image.Image, output_path: Path, padded_size: int, max_zoom: int, tile_size: int, workers: int | None = None
+) -> int:
+    """Pad the source, build the pyramid with Pillow and save its tiles on a thread pool. Returns the tile count."""
+    original_width, original_height = source.size
+    
+    if source.size == (padded_size, padded_size):
+        # Already a power-of-2 square, no canvas needed
+        padded = source
+    else:
+        # Create padded image (center the original on a padded canvas)
+        logger.info("Creating padded image...")
+        padded = Image.new('RGB', (padded_size, padded_size), BACKGROUND_COLOR)
+        # Paste at top-left (0, 0) - not centered, to match coordinate system
+        padded.paste(source, (0, 0))
+    
+    # Generate tiles for each zoom level, from max zoom down: each level is
+    # the previous one halved, so the full-size canvas is resampled only once
+    total_tiles = 0
+    level_summaries = []
+    resized = padded
+    del padded
+    executor = ThreadPoolExecutor(max_workers=workers or os.cpu_count())
+    try:
+        for zoom in range(max_zoom, -1, -1):
+            zoom_dir = f"{output_path}/{zoom}"
+            
+            # Calculate size at this zoom level
+            size_at_zoom = tile_size * (2 ** zoom)
+            
+            # Halve the previous level (2x2 box average) to reach this zoom level;
+            # with a tile size that isn't a power of 2, max zoom is a plain resize
+            if resized.width == 2 * size_at_zoom:
+                resized = resized.reduce(2)
+            elif resized.width != size_at_zoom:
+                resized = resized.resize((size_at_zoom, size_at_zoom), Image.Resampling.BOX)
+            resized_arr = np.asarray(resized)
+            
+            # Calculate number of tiles
+            num_tiles = 2 ** zoom
+            
+            # Skip tiles that only contain padding (the site background shows through)
+            num_cols = count_content_tiles(original_width, num_tiles, padded_size)
+            num_rows = count_content_tiles(original_height, num_tiles, padded_size)
+            
+            level_summaries.append(f"  Zoom {zoom}: {num_tiles}x{num_tiles} tiles ({size_at_zoom}px)")
+            
+            # Generate tiles, one row strip of tiles per task
+            futures = [
+                executor.submit(save_tile_row, resized_arr, y, num_cols, tile_size, zoom_dir)
+                for y in range(num_rows)
+            ]
+            for future in futures:
+                total_tiles += future.result()
+    finally:
+        # Stop the pool even if a tile failed, cancelling rows not yet started
+        executor.shutdown(cancel_futures=True)
+    
+    # Logged once the pyramid is done rather than from inside the tile loop
+    logger.info("\n".join(reversed(level_summaries)))
+    
+    return total_tiles
+
+
+def save_tiles_vips(source_path: str, output_path: Path, tile_size: int, max_zoom: int) -> int:
+    """
+    Build the pyramid with libvips dzsave and save its tiles. Returns the tile count.
+    
+    The source is streamed and tiled in C across all cores. dzsave's google
+    layout pads at the top-left and skips background-only tiles like the
+    Pillow path, but names tiles z/y/x, so they are moved to Leaflet's z/x/y.
+    """
+    logger.info("Generating tiles with libvips...")
+    source = pyvips.Image.new_from_file(source_path, access='sequential').colourspace('srgb')
+    if source.hasalpha():
+        # Drop alpha like Image.convert('RGB') does
+        source = source.extract_band(0, n=3)
+    
+    total_tiles = 0
+    with tempfile.TemporaryDirectory(dir=output_path) as staging_dir:
+        # dzsave doesn't create the directory itself if every tile is blank
+        pyramid_dir = f"{staging_dir}/pyramid"
+        os.mkdir(pyramid_dir)
+        source.dzsave(
+            pyramid_dir,
+            layout='google',
+            tile_size=tile_size,
+            overlap=0,
+            depth='onetile',
+            suffix='.jpg[Q=85,optimize_coding]',
+            background=list(BACKGROUND_COLOR),
+            skip_blanks=0
+        )
+        
+        # dzsave pads to tile_size * 2**n; a level past max_zoom means the
+        # pyramid disagrees with the metadata (blank levels may be missing)
+        if os.path.exists(f"{pyramid_dir}/{max_zoom + 1}"):
+            raise RuntimeError(f"libvips built more than the expected {max_zoom + 1} zoom levels")
+        
+        for zoom in range(max_zoom + 1):
+            zoom_dir = f"{pyramid_dir}/{zoom}"
+            if not os.path.isdir(zoom_dir):
+                continue  # Every tile at this level was blank
+            for y in os.listdir(zoom_dir):
+                for name in os.listdir(f"{zoom_dir}/{y}"):
+                    x = name.removesuffix('.jpg')
+                    os.replace(f"{zoom_dir}/{y}/{name}", f"{output_path}/{zoom}/{x}/{y}.jpg")
+                    total_tiles += 1
+    
+    return total_tiles
+
+
+def generate_tiles(
+    source_path: str, output_dir: str, tile_size: int = 256, workers: int | None = None, use_vips: bool = True
+):
+    """Generate map tiles from source image, with libvips when pyvips is installed, else Pillow."""
+    
+    logger.info(f"Loading source image: {source_path}")
+    # Lazy: only the header is read until the Pillow path converts the image
     source = Image.open(source_path)
     original_width, original_height = source.size
-    print(f"Original dimensions: {original_width} x {original_height}")
     
     # Calculate padded size (next power of 2 that fits both dimensions)
     max_dim = max(original_width, original_height)
     padded_size = next_power_of_2(max_dim)
-    print(f"Padded size: {padded_size}")
     
     # Calculate max zoom level
-    max_zoom = int(math.log2(padded_size / tile_size))
-    print(f"Max zoom: {max_zoom} (tile size: {tile_size})")
+    max_zoom = (padded_size // tile_size).bit_length() - 1
+    logger.info(
+        f"Original dimensions: {original_width} x {original_height}\n"
+        f"Padded size: {padded_size}\n"
+        f"Max zoom: {max_zoom} (tile size: {tile_size})"
+    )
     
     # Create output directory
     output_path = Path(output_dir)
     output_path.mkdir(parents=True, exist_ok=True)
+    create_tile_directories(output_path, max_zoom)
     
-    # Create padded image (center the original on a padded canvas)
-    print(f"Creating padded image...")
-    padded = Image.new('RGB', (padded_size, padded_size), (26, 26, 46))  # Match site background #1a1a2e
-    # Paste at top-left (0, 0) - not centered, to match coordinate system
-    padded.paste(source, (0, 0))
-    
-    # Generate tiles for each zoom level
-    total_tiles = 0
-    for zoom in range(max_zoom + 1):
-        zoom_dir = output_path / str(zoom)
-        zoom_dir.mkdir(exist_ok=True)
-        
-        # Calculate size at this zoom level
-        size_at_zoom = tile_size * (2 ** zoom)
-        
-        # Resize padded image to this zoom level
-        if size_at_zoom != padded_size:
-            resized = padded.resize((size_at_zoom, size_at_zoom), Image.Resampling.LANCZOS)
-        else:
-            resized = padded
-        
-        # Calculate number of tiles
-        num_tiles = 2 ** zoom
-        
-        print(f"  Zoom {zoom}: {num_tiles}x{num_tiles} tiles ({size_at_zoom}px)")
-        
-        # Generate tiles
-        for x in range(num_tiles):
-            x_dir = zoom_dir / str(x)
-            x_dir.mkdir(exist_ok=True)
-            
-            for y in range(num_tiles):
-                # Extract tile
-                left = x * tile_size
-                upper = y * tile_size
-                right = left + tile_size
-                lower = upper + tile_size
-                
-                tile = resized.crop((left, upper, right, lower))
-                
-                # Save tile
-                tile_path = x_dir / f"{y}.jpg"
-                tile.save(tile_path, "JPEG", quality=85)
-                total_tiles += 1
-    
-    print(f"Generated {total_tiles} tiles")
+    # dzsave can only reproduce the padded size when it is tile_size * 2**max_zoom
+    if use_vips and pyvips is not None and max_zoom >= 0 and padded_size == tile_size << max_zoom:
+        total_tiles = save_tiles_vips(source_path, output_path, tile_size, max_zoom)
+    else:
+        # JPEG tiles have no alpha channel, so don't carry one through the pyramid
+        total_tiles = save_tiles_pillow(
+            source.convert('RGB'), output_path, padded_size, max_zoom, tile_size, workers
+        )
     
     # Save metadata
     metadata = {
@@ -107,14 +251,17 @@ def generate_tiles(source_path: str, output_dir: str, tile_size: int = 256):
     
     metadata_path = output_path / "metadata.json"
     with open(metadata_path, 'w') as f:
-        json.dump(metadata, f, indent=2)
+        json.dump(metadata, f)
     
-    print(f"Saved metadata to {metadata_path}")
-    print(f"\nDone! Update calibration.ts with:")
-    print(f"  width: {original_width}")
-    print(f"  height: {original_height}")
-    print(f"  paddedSize: {padded_size}")
-    print(f"  maxZoom: {max_zoom}")
+    logger.info(
+        f"Generated {total_tiles} tiles\n"
+        f"Saved metadata to {metadata_path}\n"
+        "\nDone! Update calibration.ts with:\n"
+        f"  width: {original_width}\n"
+        f"  height: {original_height}\n"
+        f"  paddedSize: {padded_size}\n"
+        f"  maxZoom: {max_zoom}"
+    )
     
     return metadata
 
@@ -124,6 +271,8 @@ if __name__ == "__main__":
         print(__doc__)
         sys.exit(1)
     
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    logging.getLogger('pyvips').setLevel(logging.WARNING)  # Silence libvips progress chatter
     source = sys.argv[1]
     output = sys.argv[2]
     tile_size = int(sys.argv[3]) if len(sys.argv) > 3 else 256
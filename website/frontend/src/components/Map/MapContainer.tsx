@@ -252,16 +252,16 @@ const MapContainer = forwardRef<MapContainerHandle, MapContainerProps>(
         // Update max zoom
         map.setMaxZoom(newConfig.maxZoom);
 
-        // Calculate new bounds
-        const southWest = map.unproject(
-          [0, newConfig.paddedSize],
+        // Calculate bounds for actual image (not padded)
+        const imageSouthWest = map.unproject(
+          [0, newConfig.height],
           newConfig.maxZoom
         );
-        const northEast = map.unproject(
-          [newConfig.paddedSize, 0],
+        const imageNorthEast = map.unproject(
+          [newConfig.width, 0],
           newConfig.maxZoom
         );
-        const tileBounds = new L.LatLngBounds(southWest, northEast);
+        const imageBounds = new L.LatLngBounds(imageSouthWest, imageNorthEast);
 
         // Add new tile layer (cache buster only in dev mode)
         const cacheBuster = import.meta.env.DEV ? `?v=${Date.now()}` : '';
@@ -272,21 +272,11 @@ const MapContainer = forwardRef<MapContainerHandle, MapContainerProps>(
             maxZoom: newConfig.maxZoom,
             tileSize: newConfig.tileSize,
             noWrap: true,
-            bounds: tileBounds,
+            // Padding-only tiles aren't generated, so don't request them
+            bounds: imageBounds,
           }
         ).addTo(map);
 
-        // Calculate bounds for actual image (not padded)
-        const imageSouthWest = map.unproject(
-          [0, newConfig.height],
-          newConfig.maxZoom
-        );
-        const imageNorthEast = map.unproject(
-          [newConfig.width, 0],
-          newConfig.maxZoom
-        );
-        const imageBounds = new L.LatLngBounds(imageSouthWest, imageNorthEast);
-
         map.setMaxBounds(imageBounds.pad(0.02));
         
         // Set map bounds initially
@@ -330,9 +320,10 @@ const MapContainer = forwardRef<MapContainerHandle, MapContainerProps>(
       map.createPane('selectedMarkersPane');
       map.getPane('selectedMarkersPane')!.style.zIndex = '850'; // Selected route markers
 
-      const southWest = map.unproject([0, config.paddedSize], config.maxZoom);
-      const northEast = map.unproject([config.paddedSize, 0], config.maxZoom);
-      const tileBounds = new L.LatLngBounds(southWest, northEast);
+      // Calculate bounds for actual image (not padded)
+      const imageSouthWest = map.unproject([0, config.height], config.maxZoom);
+      const imageNorthEast = map.unproject([config.width, 0], config.maxZoom);
+      const imageBounds = new L.LatLngBounds(imageSouthWest, imageNorthEast);
 
       // Cache buster for tiles (only in dev mode)
       const cacheBuster = import.meta.env.DEV ? `?v=${Date.now()}` : '';
@@ -343,15 +334,11 @@ const MapContainer = forwardRef<MapContainerHandle, MapContainerProps>(
           maxZoom: config.maxZoom,
           tileSize: config.tileSize,
           noWrap: true,
-          bounds: tileBounds,
+          // Padding-only tiles aren't generated, so don't request them
+          bounds: imageBounds,
         }
       ).addTo(map);
 
-      // Calculate bounds for actual image (not padded)
-      const imageSouthWest = map.unproject([0, config.height], config.maxZoom);
-      const imageNorthEast = map.unproject([config.width, 0], config.maxZoom);
-      const imageBounds = new L.LatLngBounds(imageSouthWest, imageNorthEast);
-
       map.fitBounds(imageBounds);
       map.setMaxBounds(imageBounds.pad(0.02));
 